@@ -0,0 +1,63 @@
+"""
+Batch Story Producer - pre-render story catalogs from the command line
+Usage: python -m app.batch --books "Moby Dick.txt" --lengths short medium --out catalog
+"""
+
+import os
+import sys
+import json
+import asyncio
+import argparse
+
+# Add current directory to path to import models
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.main import service, BOOKS_DIR, BATCH_MAX_CONCURRENCY
+
+
+async def run_batch(books, lengths, styles, out_dir, max_concurrency):
+    """Write each story to out_dir as soon as it finishes, plus a catalog.jsonl index."""
+    os.makedirs(out_dir, exist_ok=True)
+    catalog_file = os.path.join(out_dir, "catalog.jsonl")
+    failures = 0
+
+    with open(catalog_file, 'a', encoding='utf-8') as catalog:
+        async for result in service.produce_batch(books, lengths, styles, max_concurrency):
+            if "story" in result:
+                story_file = os.path.join(
+                    out_dir,
+                    f"{result['book_filename'].replace('.txt', '').replace(' ', '_')}_{result['length']}_{result['style']}.txt"
+                )
+                with open(story_file, 'w', encoding='utf-8') as f:
+                    f.write(result["story"])
+                result = {k: v for k, v in result.items() if k != "story"}
+                result["story_file"] = story_file
+                print(f"✅ {result['book_filename']} | {result['length']} | {result['style']} ({result['duration_seconds']}s)")
+            else:
+                failures += 1
+                print(f"❌ {result.get('book_filename')} | {result.get('length')} | {result.get('style')}: {result['error']}")
+
+            catalog.write(json.dumps(result, ensure_ascii=False) + "\n")
+            catalog.flush()
+
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate all length x style stories for books.")
+    parser.add_argument("--books", nargs="*", help="Book filenames in static/books (default: all)")
+    parser.add_argument("--lengths", nargs="*", choices=list(service.generator.length_map),
+                        help="Story lengths (default: all)")
+    parser.add_argument("--styles", nargs="*", choices=list(service.generator.style_map),
+                        help="Story styles (default: all)")
+    parser.add_argument("--out", default="catalog", help="Output folder")
+    parser.add_argument("--max-concurrency", type=int, default=BATCH_MAX_CONCURRENCY)
+    args = parser.parse_args()
+
+    books = args.books or sorted(f for f in os.listdir(BOOKS_DIR) if f.endswith(".txt"))
+    failures = asyncio.run(run_batch(books, args.lengths, args.styles, args.out, args.max_concurrency))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,13 @@
 from fastapi import FastAPI, HTTPException
-from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi import Request
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, List
 import os
 import sys
 import hashlib
+import tempfile
 import time
 import json
 import asyncio
@@ -19,25 +19,56 @@ from app.models.analyzer import BookAnalyzer
 from app.models.generator import StoryGenerator
 from app.api_key import GEMINI_API_KEY
 from app.utils.logger import story_logger
+from app.utils.upload import StreamingTextHasher
+from app.utils.profiler import RequestProfiler
+from app.utils.memory import MemoryTracker
+from app.utils.assets import PrecompressedStaticFiles, AssetManifest, build_assets, compressed_json, precompress_file
 
 app = FastAPI()
 
+BOOKS_DIR = "static/books"
+
+# Streamed uploads
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+UPLOAD_PREFIX_CHARS = 200_000  # Enough raw text to clean and parse the first sample early
+
+# Batch generation - max Gemini calls in flight
+BATCH_MAX_CONCURRENCY = 4
+
+# Opt-in request profiling (X-Profile: 1 header or ?profile=1) - off unless enabled
+PROFILING_ENABLED = os.environ.get("STORY_PROFILING_ENABLED", "0") == "1"
+
+# Progressive analysis - max seconds to wait for the preliminary pass
+PRELIMINARY_BUDGET_SECONDS = 3.0
+
+# Fingerprinted asset URLs - manifest is filled on server startup
+assets = AssetManifest({})
+
 # Mount static files
-app.mount("/static", StaticFiles(directory="static"), name="static")
+app.mount("/static", PrecompressedStaticFiles(directory="static"), name="static")
 
 # Templates
 templates = Jinja2Templates(directory="templates")
+templates.env.globals["asset_url"] = assets.url
 
 class StoryRequest(BaseModel):
     book_filename: str
     length: Optional[str] = "medium"
     style: Optional[str] = "same"
 
+class BatchStoryRequest(BaseModel):
+    book_filenames: List[str]
+    lengths: Optional[List[str]] = None  # Default: all lengths
+    styles: Optional[List[str]] = None  # Default: all styles
+    max_concurrency: int = BATCH_MAX_CONCURRENCY
+
 class StoryProducerService:
     def __init__(self):
         self.analyzer = BookAnalyzer()
         self.generator = StoryGenerator(GEMINI_API_KEY)
         self._analysis_cache = {}  # Cache book analysis results
+        self._background_tasks = set()  # Keep references to running full analyses
+        self._book_hashes = {}  # filename -> (mtime, size, text hash) for static/books
 
     def produce(self, file_path: str, length: str = "medium", style: str = "same") -> dict:
         # 1. Read file
@@ -48,13 +79,7 @@ class StoryProducerService:
             raise HTTPException(status_code=404, detail="Book file not found")
         
         # 2. Check cache - has this book been analyzed before?
-        text_hash = hashlib.md5(text.encode()).hexdigest()
-        
-        if text_hash in self._analysis_cache:
-            analysis_data = self._analysis_cache[text_hash]
-        else:
-            analysis_data = self.analyzer.analyze(text)
-            self._analysis_cache[text_hash] = analysis_data
+        analysis_data = self._get_analysis(text)
         
         # 3. Generate with options
         story = self.generator.generate(analysis_data, length=length, style=style)
@@ -64,24 +89,319 @@ class StoryProducerService:
             "analysis": analysis_data
         }
 
-    async def produce_with_progress(self, file_path: str, length: str = "medium", style: str = "same"):
-        """Story generation with progress status - generator for SSE."""
+    def _get_analysis(self, text: str) -> dict:
+        """Analysis for the text - from cache when this book was analyzed before."""
+        text_hash = hashlib.md5(text.encode()).hexdigest()
+        
+        if text_hash not in self._analysis_cache:
+            self._analysis_cache[text_hash] = self.analyzer.analyze(text)
+        
+        return self._analysis_cache[text_hash]
+
+    def validate_batch_options(self, lengths: Optional[List[str]], styles: Optional[List[str]]):
+        """Reject unknown lengths/styles - they would silently fall back to medium/same."""
+        unknown_lengths = [l for l in lengths or [] if l not in self.generator.length_map]
+        unknown_styles = [s for s in styles or [] if s not in self.generator.style_map]
+        
+        if unknown_lengths or unknown_styles:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown lengths: {unknown_lengths}, styles: {unknown_styles}. "
+                       f"Valid lengths: {list(self.generator.length_map)}, styles: {list(self.generator.style_map)}"
+            )
+
+    async def produce_batch(self, book_filenames: List[str], lengths: Optional[List[str]] = None,
+                            styles: Optional[List[str]] = None,
+                            max_concurrency: int = BATCH_MAX_CONCURRENCY):
+        """Generate every length x style combination for each book - results yielded as they finish.
+        
+        Each book is analyzed once, all prompts are built up front and Gemini
+        calls are fanned out with at most max_concurrency in flight.
+        """
+        lengths = lengths or list(self.generator.length_map)
+        styles = styles or list(self.generator.style_map)
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        
+        # 1. Analyze each book once and build all prompts
+        jobs = []
+        for book_filename in book_filenames:
+            file_path = os.path.join(BOOKS_DIR, os.path.basename(book_filename))
+            try:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    text = f.read()
+                analysis_data = await asyncio.to_thread(self._get_analysis, text)
+            except Exception as e:
+                yield {"book_filename": book_filename, "error": str(e)}
+                continue
+            
+            for length in lengths:
+                for style in styles:
+                    prompt = self.generator._build_prompt(analysis_data, length, style)
+                    jobs.append((book_filename, length, style, prompt))
+        
+        # 2. Fan generation out with bounded concurrency
+        async def run_job(book_filename, length, style, prompt):
+            result = {"book_filename": book_filename, "length": length, "style": style}
+            async with semaphore:
+                started = time.time()
+                try:
+                    result["story"], result["generation"] = await asyncio.to_thread(
+                        self.generator.generate_from_prompt, prompt, length
+                    )
+                except Exception as e:
+                    result["error"] = str(e)
+                result["duration_seconds"] = round(time.time() - started, 3)
+            return result
+        
+        tasks = [asyncio.create_task(run_job(*job)) for job in jobs]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # Client went away - drop jobs that haven't started
+            for task in tasks:
+                task.cancel()
+
+    def _find_book_by_hash(self, text_hash: str) -> Optional[str]:
+        """Filename of the stored book with this text hash (only changed files are re-hashed)."""
+        found = None
+        for name in sorted(os.listdir(BOOKS_DIR)):
+            if not name.endswith(".txt"):
+                continue
+            
+            path = os.path.join(BOOKS_DIR, name)
+            stat_result = os.stat(path)
+            cached = self._book_hashes.get(name)
+            if not cached or cached[:2] != (stat_result.st_mtime, stat_result.st_size):
+                with open(path, 'r', encoding='utf-8') as f:
+                    book_hash = hashlib.md5(f.read().encode()).hexdigest()
+                cached = (stat_result.st_mtime, stat_result.st_size, book_hash)
+                self._book_hashes[name] = cached
+            
+            if found is None and cached[2] == text_hash:
+                found = name
+        
+        return found
+
+    async def upload_book(self, filename: str, chunks) -> dict:
+        """Store a streamed book upload and analyze it.
+        
+        Text is hashed while it arrives and the first sample is parsed as soon as
+        enough of the book is received. Books already in static/books (same text,
+        any name) are not stored again and their cached analysis is reused.
+        """
+        filename = os.path.basename(filename)
+        if not filename.endswith(".txt"):
+            raise HTTPException(status_code=400, detail="Only .txt books are supported")
+        
+        file_path = os.path.join(BOOKS_DIR, filename)
+        
+        # Unique temp file per upload - concurrent uploads of the same name don't collide
+        with tempfile.NamedTemporaryFile(dir=BOOKS_DIR, suffix=".upload", delete=False) as tmp_file:
+            tmp_path = tmp_file.name
+        
+        hasher = StreamingTextHasher(prefix_limit=UPLOAD_PREFIX_CHARS)
+        prefix_task = None
+        received = 0
+        
+        try:
+            with open(tmp_path, 'wb') as f:
+                async for chunk in chunks:
+                    received += len(chunk)
+                    if received > MAX_UPLOAD_BYTES:
+                        raise HTTPException(status_code=413, detail="Book file too large")
+                    
+                    hasher.feed(chunk)
+                    f.write(chunk)
+                    
+                    # Enough text received - start cleaning/sampling before the upload finishes
+                    if prefix_task is None and len(hasher.prefix) >= UPLOAD_PREFIX_CHARS:
+                        prefix_task = asyncio.create_task(
+                            asyncio.to_thread(self.analyzer._warm_prefix, hasher.prefix)
+                        )
+                
+                hasher.finish()
+        except UnicodeDecodeError:
+            os.remove(tmp_path)
+            raise HTTPException(status_code=400, detail="Book file must be UTF-8 text")
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        
+        text_hash = hasher.hexdigest()
+        
+        # Already stored (under any name) - skip duplicate storage and analysis
+        stored_filename = await asyncio.to_thread(self._find_book_by_hash, text_hash)
+        if stored_filename is not None:
+            os.remove(tmp_path)
+            with open(os.path.join(BOOKS_DIR, stored_filename), 'r', encoding='utf-8') as f:
+                text = f.read()
+            return {
+                "book_filename": stored_filename,
+                "text_hash": text_hash,
+                "duplicate": True,
+                "analysis": await asyncio.to_thread(self._get_analysis, text)
+            }
+        
+        # link fails if the name exists - no check-then-replace race between concurrent uploads
+        try:
+            os.link(tmp_path, file_path)
+        except FileExistsError:
+            raise HTTPException(status_code=409, detail="A different book with this name already exists")
+        finally:
+            os.remove(tmp_path)
+        
+        # Serve the new book compressed right away, like the bundled ones
+        await asyncio.to_thread(precompress_file, file_path)
+        
+        if prefix_task is not None:
+            # Only a cache warm-up - the book is already stored, so don't fail the upload
+            try:
+                await prefix_task
+            except Exception as e:
+                story_logger.log_error(str(e), "Upload Prefix Warm-up")
+        
+        with open(file_path, 'r', encoding='utf-8') as f:
+            text = f.read()
+        analysis_data = await asyncio.to_thread(self.analyzer.analyze, text)
+        self._analysis_cache[text_hash] = analysis_data
+        
+        return {
+            "book_filename": filename,
+            "text_hash": text_hash,
+            "duplicate": False,
+            "analysis": analysis_data
+        }
+
+    def reanalyze_library(self, books_dir: str = BOOKS_DIR) -> dict:
+        """Recompute analysis for every book from cached spaCy Docs.
+        
+        Use after changing aggregation logic (mood words, excluded names, limits) -
+        only samples missing from the Doc cache are parsed again.
+        """
+        results = {}
+        for book in sorted(os.listdir(books_dir)):
+            if not book.endswith(".txt"):
+                continue
+            
+            started = time.time()
+            with open(os.path.join(books_dir, book), 'r', encoding='utf-8') as f:
+                text = f.read()
+            
+            text_hash = hashlib.md5(text.encode()).hexdigest()
+            self._analysis_cache[text_hash] = self.analyzer.analyze(text)
+            results[book] = round(time.time() - started, 3)
+        
+        return results
+
+    def _store_full_analysis(self, text_hash: str, task: asyncio.Task):
+        """Replace preliminary cache entry once the background full analysis is done."""
+        self._background_tasks.discard(task)
+        if task.cancelled() or task.exception() is not None:
+            # Don't keep serving the preliminary analysis as if it were complete
+            if self._analysis_cache.get(text_hash, {}).get('preliminary'):
+                del self._analysis_cache[text_hash]
+            return
+        self._analysis_cache[text_hash] = task.result()
+
+    def _to_thread(self, profiler: Optional[RequestProfiler], func, *args, **kwargs):
+        """asyncio.to_thread, profiled when the request is being profiled."""
+        return asyncio.to_thread(profiler.wrap(func) if profiler else func, *args, **kwargs)
+
+    def _progress_reporter(self, queue: asyncio.Queue, source: str = "analysis"):
+        """Analyzer progress callback - safe to call from the worker thread.
+        
+        Events are queued as (source, stage, done, total) so the preliminary and the
+        background full analysis can share one queue.
+        """
+        loop = asyncio.get_running_loop()
+        
+        def report(stage, done, total):
+            loop.call_soon_threadsafe(queue.put_nowait, (source, stage, done, total))
+        
+        return report
+
+    async def _drain_progress(self, queue: asyncio.Queue, *tasks: asyncio.Task):
+        """Yield progress events from the queue until any of the tasks is done."""
+        while not any(task.done() for task in tasks):
+            getter = asyncio.ensure_future(queue.get())
+            await asyncio.wait({getter, *tasks}, return_when=asyncio.FIRST_COMPLETED)
+            if getter.done():
+                yield getter.result()
+            else:
+                getter.cancel()
+        
+        # Events that arrived together with the result
+        while not queue.empty():
+            yield queue.get_nowait()
+
+    def _progress_message(self, source: str, stage: str, done: int, total: int, refining: bool = False) -> dict:
+        """SSE payload for an analyzer progress event (NLP analysis spans 30% -> 60%).
+        
+        refining=True is the background full analysis after the preliminary one was
+        used - reported without a step so the current step in the UI stays put.
+        """
+        if refining:
+            message = {'refining': True, 'source': source, 'stage': stage,
+                       'status': f'Refining analysis: {stage} done...'}
+            if stage == 'sample':
+                message.update({'status': f'Refining analysis: sample {done}/{total}...',
+                                'samples_done': done, 'samples_total': total})
+            return message
+        if stage == 'sample':
+            return {'step': 4, 'status': f'Analyzing sample {done}/{total}...',
+                    'progress': 30 + int(25 * done / total), 'samples_done': done, 'samples_total': total}
+        if stage == 'sentiment':
+            return {'step': 4, 'status': 'Sentiment analysis done...', 'progress': 57}
+        return {'step': 4, 'status': 'Keywords extracted...', 'progress': 59}
+
+    def _save_profile(self, profiler: Optional[RequestProfiler], pending_task: Optional[asyncio.Task] = None):
+        """Save request profile next to the session log and record its path.
+        
+        With a still running background full analysis (progressive mode) the file is
+        written once that task is done, so its NLP work is included.
+        """
+        profile_path = story_logger.get_profile_path()
+        if not profiler or not profile_path:
+            return
+        
+        # Calls that overlapped another profiled call ran unprofiled
+        story_logger.log_metric("profile_skipped_calls", profiler.skipped_calls)
+        
+        if pending_task is not None and not pending_task.done():
+            pending_task.add_done_callback(lambda t: profiler.save(profile_path))
+            story_logger.log_metric("profile_path", profile_path)
+            story_logger.log_metric("profile_written_after_full_analysis", True)
+            return
+        
+        profile_path = profiler.save(profile_path)
+        story_logger.log_metric("profile_path", profile_path)
+
+    async def produce_with_progress(self, file_path: str, length: str = "medium", style: str = "same",
+                                    progressive: bool = False, profiler: Optional[RequestProfiler] = None):
+        """Story generation with progress status - generator for SSE.
+        
+        In progressive mode a fast preliminary analysis unblocks story generation,
+        while the full analysis keeps running and is sent as a later 'refined' event.
+        """
         
         # Get book name
         book_name = os.path.basename(file_path)
         
         # Start logging session
         story_logger.start_session(book_name, length, style)
+        memory = MemoryTracker()
+        full_task = None  # Background full analysis (progressive mode)
         
         try:
             # 1. File reading
             story_logger.log_step("File Reading")
             yield f"data: {json.dumps({'step': 1, 'status': 'Reading file...', 'progress': 5})}\n\n"
-            await asyncio.sleep(0.05)
             
             try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    text = f.read()
+                with memory.stage("file_reading"):
+                    with open(file_path, 'r', encoding='utf-8') as f:
+                        text = f.read()
                 story_logger.log_metric("file_size_bytes", len(text))
             except FileNotFoundError:
                 story_logger.log_error("Book file not found", "File Reading")
@@ -90,31 +410,31 @@ class StoryProducerService:
                 return
             
             # 2. Cache check
-            text_hash = hashlib.md5(text.encode()).hexdigest()
+            with memory.stage("hashing"):
+                text_hash = hashlib.md5(text.encode()).hexdigest()
             story_logger.log_metric("text_hash", text_hash)
             
             if text_hash in self._analysis_cache:
                 story_logger.log_cache_hit(book_name)
                 cache_msg = json.dumps({'step': 2, 'status': "Loading from cache...", 'progress': 50, 'cached': True})
                 yield f"data: {cache_msg}\n\n"
-                await asyncio.sleep(0.1)
                 analysis_data = self._analysis_cache[text_hash]
             else:
                 # 3. Text cleaning
                 story_logger.log_step("Text Cleaning")
                 yield f"data: {json.dumps({'step': 2, 'status': 'Cleaning text...', 'progress': 10})}\n\n"
-                await asyncio.sleep(0.05)
                 
                 original_size = len(text)
-                cleaned_text = await asyncio.to_thread(self.analyzer._clean_text, text)
+                with memory.stage("text_cleaning"):
+                    cleaned_text = await self._to_thread(profiler, self.analyzer._clean_text, text)
                 story_logger.log_text_stats(original_size, len(cleaned_text))
                 
                 # 4. Sampling
                 story_logger.log_step("Sampling")
                 yield f"data: {json.dumps({'step': 3, 'status': 'Sampling text...', 'progress': 20})}\n\n"
-                await asyncio.sleep(0.05)
                 
-                samples = self.analyzer._get_strategic_samples(cleaned_text)
+                with memory.stage("sampling"):
+                    samples = await self._to_thread(profiler, self.analyzer._get_adaptive_samples, cleaned_text)
                 total_sample_size = sum(len(s) for s in samples)
                 story_logger.log_sampling(len(samples), self.analyzer.sample_size, total_sample_size)
                 
@@ -122,41 +442,136 @@ class StoryProducerService:
                 story_logger.log_step("NLP Analysis")
                 yield f"data: {json.dumps({'step': 4, 'status': 'Performing NLP analysis...', 'progress': 30})}\n\n"
                 
-                analysis_data = await asyncio.to_thread(
-                    self.analyzer._analyze_samples, samples, cleaned_text
-                )
-                story_logger.log_analysis_results(analysis_data)
+                # Real progress from the analyzer thread(s) -> SSE
+                progress_queue = asyncio.Queue()
+                
+                with memory.stage("nlp_analysis"):
+                    if progressive:
+                        # Full analysis runs in the background and replaces the cache entry when done
+                        memory.start_stage("full_analysis")
+                        full_started = time.time()
+                        full_task = asyncio.create_task(self._to_thread(
+                            profiler, self.analyzer._analyze_samples, samples, cleaned_text,
+                            progress=self._progress_reporter(progress_queue, "full")
+                        ))
+                        self._background_tasks.add(full_task)
+                        full_task.add_done_callback(lambda t: self._store_full_analysis(text_hash, t))
+                        full_task.add_done_callback(lambda t: memory.end_stage("full_analysis"))
+                        
+                        analysis_task = asyncio.create_task(asyncio.wait_for(
+                            self._to_thread(profiler, self.analyzer._analyze_preliminary, samples, cleaned_text,
+                                            progress=self._progress_reporter(progress_queue, "preliminary")),
+                            timeout=PRELIMINARY_BUDGET_SECONDS
+                        ))
+                    else:
+                        analysis_task = asyncio.create_task(self._to_thread(
+                            profiler, self.analyzer._analyze_samples, samples, cleaned_text,
+                            progress=self._progress_reporter(progress_queue)
+                        ))
+                    
+                    async for event in self._drain_progress(progress_queue, analysis_task):
+                        message = self._progress_message(*event, refining=event[0] == "full")
+                        yield f"data: {json.dumps(message)}\n\n"
+                    
+                    if progressive:
+                        try:
+                            analysis_data = analysis_task.result()
+                            story_logger.log_metric("preliminary_analysis", True)
+                            self._analysis_cache.setdefault(text_hash, analysis_data)
+                        except asyncio.TimeoutError:
+                            # Over budget - wait for the full analysis, its progress is now the main progress
+                            story_logger.log_metric("preliminary_analysis", False)
+                            async for event in self._drain_progress(progress_queue, full_task):
+                                # The timed-out preliminary thread can't be stopped - ignore its events
+                                if event[0] == "full":
+                                    yield f"data: {json.dumps(self._progress_message(*event))}\n\n"
+                            analysis_data = await full_task
+                            full_task = None
+                    else:
+                        analysis_data = analysis_task.result()
+                        # Save to cache
+                        self._analysis_cache[text_hash] = analysis_data
                 
-                # Save to cache
-                self._analysis_cache[text_hash] = analysis_data
+                story_logger.log_analysis_results(analysis_data)
+                story_logger.log_adaptive_sampling(analysis_data.get("sampling", {}))
                 
                 story_logger.log_step("Analysis Completed")
-                yield f"data: {json.dumps({'step': 5, 'status': 'Analysis completed!', 'progress': 60, 'analysis': analysis_data})}\n\n"
+                yield f"data: {json.dumps({'step': 5, 'status': 'Analysis completed!', 'progress': 60, 'analysis': analysis_data, 'preliminary': full_task is not None})}\n\n"
             
             # 6. Story generation
             story_logger.log_step("Story Generation")
             yield f"data: {json.dumps({'step': 6, 'status': 'Writing story...', 'progress': 70})}\n\n"
-            await asyncio.sleep(0.05)
             
-            story = await asyncio.to_thread(
-                self.generator.generate, analysis_data, length, style
-            )
+            memory.start_stage("story_generation")
+            gen_task = asyncio.create_task(self._to_thread(
+                profiler, self.generator.generate_with_stats, analysis_data, length, style
+            ))
+            
+            # Progressive mode - send the full analysis if it finishes while the story is being written
+            if full_task is not None:
+                async for event in self._drain_progress(progress_queue, gen_task, full_task):
+                    yield f"data: {json.dumps(self._progress_message(*event, refining=True))}\n\n"
+                if full_task.done() and full_task.exception() is not None:
+                    # Keep writing from the preliminary analysis
+                    story_logger.log_error(str(full_task.exception()), "Full Analysis")
+                    full_task = None
+                elif full_task.done():
+                    analysis_data = await full_task
+                    full_task = None
+                    # Metric, not a step - a step here would cut the Story Generation timing short
+                    story_logger.log_metric("full_analysis_seconds", round(time.time() - full_started, 3))
+                    story_logger.log_analysis_results(analysis_data)
+                    story_logger.log_adaptive_sampling(analysis_data.get("sampling", {}))
+                    yield f"data: {json.dumps({'step': 6, 'status': 'Writing story...', 'progress': 80, 'analysis': analysis_data, 'refined': True})}\n\n"
+            
+            story, generation_stats = await gen_task
+            memory.end_stage("story_generation")
             story_logger.log_story_generated(story)
+            story_logger.log_generation_stats(generation_stats)
             
             # 7. Completed
             story_logger.log_step("Completed")
+            # Background full analysis may still run - logged as incomplete
+            memory.end_running_stages()
+            story_logger.log_memory(memory.stages)
+            self._save_profile(profiler, full_task)
             story_logger.end_session(success=True)
             
-            yield f"data: {json.dumps({'step': 7, 'status': 'Completed!', 'progress': 100, 'story': story, 'analysis': analysis_data})}\n\n"
+            yield f"data: {json.dumps({'step': 7, 'status': 'Completed!', 'progress': 100, 'story': story, 'analysis': analysis_data, 'refining': full_task is not None})}\n\n"
+            
+            # Story came first - send the full analysis once it is ready
+            if full_task is not None:
+                async for event in self._drain_progress(progress_queue, full_task):
+                    yield f"data: {json.dumps(self._progress_message(*event, refining=True))}\n\n"
+                try:
+                    analysis_data = await full_task
+                except Exception as e:
+                    # Story is already delivered and the session recorded - just close the stream
+                    story_logger.log_error(str(e), "Full Analysis")
+                    yield f"data: {json.dumps({'step': 8, 'status': 'Analysis refinement failed', 'progress': 100, 'refined': False})}\n\n"
+                    return
+                yield f"data: {json.dumps({'step': 8, 'status': 'Analysis refined!', 'progress': 100, 'analysis': analysis_data, 'refined': True})}\n\n"
             
         except Exception as e:
             story_logger.log_error(str(e))
+            # Stages cut short by the error (or still running in the background) - logged as incomplete
+            memory.end_running_stages()
+            story_logger.log_memory(memory.stages)
+            self._save_profile(profiler, full_task)
             story_logger.end_session(success=False)
             yield f"data: {json.dumps({'error': str(e)})}\n\n"
 
 # Service instance
 service = StoryProducerService()
 
+@app.on_event("startup")
+async def prepare_assets():
+    """Fingerprint + precompress static assets (up-to-date files are skipped).
+    
+    Runs on server startup only, so CLIs importing this module (app.batch) don't touch static/.
+    """
+    assets.manifest = await asyncio.to_thread(build_assets, "static")
+
 @app.get("/")
 async def read_root(request: Request):
     # List books in static/books
@@ -168,7 +583,7 @@ async def read_root(request: Request):
     return templates.TemplateResponse("index.html", {"request": request, "books": books})
 
 @app.post("/produce-story")
-async def produce_story(request: StoryRequest):
+async def produce_story(request: StoryRequest, http_request: Request):
     file_path = os.path.join("static/books", request.book_filename)
     try:
         result = service.produce(
@@ -176,17 +591,59 @@ async def produce_story(request: StoryRequest):
             length=request.length, 
             style=request.style
         )
-        return result
+        return compressed_json(result, http_request.headers.get("accept-encoding", ""))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/produce-batch")
+async def produce_batch(request: BatchStoryRequest):
+    """Batch generation - one JSON line per story as each one finishes."""
+    service.validate_batch_options(request.lengths, request.styles)
+    
+    async def result_lines():
+        async for result in service.produce_batch(
+            request.book_filenames,
+            lengths=request.lengths,
+            styles=request.styles,
+            max_concurrency=request.max_concurrency
+        ):
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+    
+    return StreamingResponse(result_lines(), media_type="application/x-ndjson")
+
+@app.post("/upload-book")
+async def upload_book(request: Request, filename: str):
+    """Streamed book upload - raw UTF-8 text in the request body."""
+    try:
+        return await service.upload_book(filename, request.stream())
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/reanalyze-library")
+async def reanalyze_library():
+    """Re-aggregate analysis for all books from the Doc cache (seconds per book)."""
+    try:
+        durations = await asyncio.to_thread(service.reanalyze_library)
+        return {"books": durations, "total_seconds": round(sum(durations.values()), 3)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/produce-story-stream")
-async def produce_story_stream(book_filename: str, length: str = "medium", style: str = "same"):
+async def produce_story_stream(request: Request, book_filename: str, length: str = "medium",
+                               style: str = "same", progressive: bool = False, profile: bool = False):
     """SSE endpoint - real-time progress status."""
     file_path = os.path.join("static/books", book_filename)
     
+    # Opt-in profiling for this request only
+    profiler = None
+    if PROFILING_ENABLED and (profile or request.headers.get("X-Profile") == "1"):
+        profiler = RequestProfiler()
+    
     return StreamingResponse(
-        service.produce_with_progress(file_path, length=length, style=style),
+        service.produce_with_progress(file_path, length=length, style=style,
+                                      progressive=progressive, profiler=profiler),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
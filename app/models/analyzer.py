@@ -5,6 +5,8 @@ import nltk
 import re
 from collections import Counter
 
+from app.models.doc_cache import DocCache
+
 # Download NLTK data if needed
 try:
     nltk.data.find('tokenizers/punkt')
@@ -17,16 +19,28 @@ except LookupError:
     nltk.download('stopwords')
 
 class BookAnalyzer:
-    def __init__(self):
+    def __init__(self, doc_cache_dir="cache/docs"):
         # FASTER: Customized pipeline for NER and POS tagging only
         self.nlp = spacy.load('en_core_web_sm', disable=['parser', 'lemmatizer', 'textcat'])
         # Increase max_length limit for large books
         self.nlp.max_length = 2_000_000
+        # Parsed samples are cached on disk - aggregation changes don't need a re-parse
+        self.doc_cache = DocCache(self.nlp, doc_cache_dir) if doc_cache_dir else None
         self.rake = Rake()
         
         # Sampling parameters - FASTER
         self.sample_size = 30_000  # 50KB -> 30KB (faster)
-        self.num_samples = 4  # 5 -> 4 samples
+        self.num_samples = 4  # Base slot count for adaptive sampling (grows with book length)
+        
+        # Adaptive sampling - stop early once top results stop changing
+        self.min_samples = 2  # Always analyze at least this many samples
+        self.max_samples = 12  # Upper limit for long, varied books
+        self.chars_per_extra_sample = 150_000  # 1 extra sample per 150KB above the base count
+        self.convergence_top_k = 8  # How many top characters/mood words must be stable
+        self.convergence_threshold = 0.85  # Rank stability needed to stop
+        
+        # Preliminary (progressive) analysis - one small sample, no RAKE
+        self.preliminary_sample_size = 15_000
         
         # Pre-defined word lists for mood words (instead of TextBlob calls)
         self.positive_mood_words = {
@@ -180,15 +194,65 @@ class BookAnalyzer:
         
         return text
 
-    def _analyze_samples(self, samples, cleaned_text):
-        """Analyze samples - separate method for SSE progress."""
+    def _clean_prefix(self, text):
+        """Clean the beginning of a book whose end hasn't arrived yet (streamed uploads).
+        
+        Same as _clean_text except for the end-of-book trimming, so the start of the
+        result matches the start of _clean_text on the full book.
+        """
+        match = self._gutenberg_start.search(text)
+        if match:
+            text = text[match.end():]
+        
+        text = self._publisher_noise.sub('', text)
+        text = self._editorial_notes.sub('', text)
+        text = self._format_artifacts.sub('', text)
+        text = self._technical_info.sub('', text)
+        
+        text = self._multi_newline.sub('\n\n', text)
+        text = self._multi_space.sub(' ', text)
+        text = text.lstrip()
+        
+        return text
+
+    def _warm_prefix(self, text_prefix):
+        """Parse the first sample of a partially received book into the Doc cache."""
+        if not self.doc_cache:
+            return 0
+        
+        cleaned_prefix = self._clean_prefix(text_prefix)
+        # Last line may continue in the next chunk - only the first sample is used
+        if len(cleaned_prefix) <= self.sample_size:
+            return 0
+        
+        first_sample = self._get_adaptive_samples(cleaned_prefix[:self.sample_size * 2])[0]
+        for _ in self.doc_cache.parse([first_sample]):
+            pass
+        
+        return len(first_sample)
+
+    def _analyze_samples(self, samples, cleaned_text, sentiment_chars=20000, extract_keywords=True,
+                         progress=None):
+        """Analyze samples - separate method for SSE progress.
+        
+        Samples are processed one at a time and processing stops once the
+        top characters and mood words have converged (see _rank_stability).
+        progress(stage, done, total) is called after each sample ('sample'),
+        after sentiment ('sentiment') and after keywords ('keywords').
+        """
+        report = progress or (lambda stage, done, total: None)
+        
         all_characters = Counter()
         all_mood_words = Counter()
         all_adjectives = Counter()
         all_verbs = Counter()
         
-        # Batch processing with spaCy
-        for doc in self.nlp.pipe(samples, batch_size=2):
+        samples_used = 0
+        stability = 0.0
+        prev_top = None
+        
+        # One doc at a time so we can stop right after the sample that converged
+        for doc in self._parse_samples(samples):
             chars = self._extract_characters(doc)
             all_characters.update(chars)
             
@@ -200,13 +264,36 @@ class BookAnalyzer:
                     all_adjectives[token.text.lower()] += 1
                 elif token.pos_ == 'VERB':
                     all_verbs[token.text.lower()] += 1
+            
+            samples_used += 1
+            report('sample', samples_used, len(samples))
+            
+            # Convergence check
+            curr_top = (
+                [name for name, _ in all_characters.most_common(self.convergence_top_k)],
+                [word for word, _ in all_mood_words.most_common(self.convergence_top_k)]
+            )
+            if prev_top is not None:
+                stability = min(
+                    self._rank_stability(prev_top[0], curr_top[0]),
+                    self._rank_stability(prev_top[1], curr_top[1])
+                )
+                if samples_used >= self.min_samples and stability >= self.convergence_threshold:
+                    break
+            prev_top = curr_top
+        
+        # Only a single sample holding the whole (small) text covers the whole book
+        if len(samples) == 1 and len(samples[0]) >= len(cleaned_text):
+            stability = 1.0
         
         # Sentiment analysis
-        sentiment_sample = cleaned_text[:20000]
+        sentiment_sample = cleaned_text[:sentiment_chars]
         sentiments = self._analyze_sentiment(sentiment_sample)
+        report('sentiment', 1, 1)
         
-        # Keywords
-        keywords = self._extract_keywords(cleaned_text[:100000])
+        # Keywords (RAKE is the slowest step - skipped in preliminary analysis)
+        keywords = self._extract_keywords(cleaned_text[:100000]) if extract_keywords else []
+        report('keywords', 1, 1)
         
         return {
             'characters': dict(all_characters.most_common(10)),
@@ -216,34 +303,90 @@ class BookAnalyzer:
             'literary_features': {
                 'common_adjectives': dict(all_adjectives.most_common(10)),
                 'common_verbs': dict(all_verbs.most_common(10))
+            },
+            'sampling': {
+                'samples_used': samples_used,
+                'samples_available': len(samples),
+                'confidence': round(stability, 3)
             }
         }
 
+    def _parse_samples(self, samples):
+        """Yield spaCy Docs for samples - from the Doc cache when available."""
+        if self.doc_cache:
+            return self.doc_cache.parse(samples)
+        return self.nlp.pipe(samples, batch_size=1)
+
+    def _analyze_preliminary(self, samples, cleaned_text, progress=None):
+        """Fast first-pass analysis - one short sample, small sentiment window, no RAKE.
+        
+        Good enough to start story generation while the full analysis runs.
+        """
+        first_sample = samples[0][:self.preliminary_sample_size] if samples else cleaned_text[:self.preliminary_sample_size]
+        
+        analysis = self._analyze_samples(
+            [first_sample], cleaned_text,
+            sentiment_chars=self.preliminary_sample_size,
+            extract_keywords=False,
+            progress=progress
+        )
+        analysis['sampling']['confidence'] = 0.0
+        analysis['preliminary'] = True
+        
+        return analysis
+
+    def _rank_stability(self, prev_ranking, curr_ranking):
+        """Rank stability between two top-k lists (0 = unrelated, 1 = identical).
+        
+        Average of the top-d overlap for every depth d, so changes near the
+        top of the ranking weigh more than changes at the bottom.
+        """
+        depth = max(len(prev_ranking), len(curr_ranking))
+        if depth == 0:
+            return 1.0
+        
+        overlap_sum = 0.0
+        for d in range(1, depth + 1):
+            overlap = len(set(prev_ranking[:d]) & set(curr_ranking[:d]))
+            overlap_sum += overlap / d
+        
+        return overlap_sum / depth
+
     def analyze(self, text):
         """Analyze text and extract data into categories - OPTIMIZED."""
         
         # General purpose text cleaning (for all sources)
         cleaned_text = self._clean_text(text)
         
-        # Strategic sampling
-        samples = self._get_strategic_samples(cleaned_text)
+        # Adaptive sampling
+        samples = self._get_adaptive_samples(cleaned_text)
         
         # Analysis
         return self._analyze_samples(samples, cleaned_text)
 
-    def _get_strategic_samples(self, text):
-        """Get strategic samples from text - from beginning, middle and end."""
+    def _get_adaptive_samples(self, text):
+        """Get samples for adaptive analysis - spread across the book in coverage order.
+        
+        Long books get more candidate samples. They are ordered so that any
+        prefix covers the book evenly (start, middle, quarters, eighths...),
+        so stopping early in _analyze_samples still gives a representative view.
+        """
         text_len = len(text)
         
         # If text is already small, return as is
         if text_len <= self.sample_size:
             return [text]
         
+        # Number of sample slots - grows with book length. Short texts keep
+        # num_samples overlapping slots so the whole text is still covered
+        extra = max(0, text_len - self.num_samples * self.sample_size) // self.chars_per_extra_sample
+        num_slots = min(self.max_samples, self.num_samples + extra)
+        
+        step = text_len // num_slots
         samples = []
-        step = text_len // self.num_samples
         
-        for i in range(self.num_samples):
-            start = i * step
+        for slot in self._coverage_order(num_slots):
+            start = slot * step
             end = min(start + self.sample_size, text_len)
             sample = text[start:end]
             
@@ -256,6 +399,18 @@ class BookAnalyzer:
         
         return samples
 
+    def _coverage_order(self, num_slots):
+        """Order slot indexes so each prefix is spread evenly (bit-reversal order)."""
+        bits = max(1, (num_slots - 1).bit_length())
+        order = []
+        
+        for i in range(1 << bits):
+            slot = int(format(i, f'0{bits}b')[::-1], 2)
+            if slot < num_slots:
+                order.append(slot)
+        
+        return order
+
     def _extract_mood_words_fast(self, doc):
         """Fast mood word extraction - without TextBlob, using pre-defined lists."""
         mood_words = Counter()
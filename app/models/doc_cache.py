@@ -0,0 +1,76 @@
+"""
+Doc Cache - Persist parsed spaCy Docs as DocBin blobs
+Aggregation changes (mood lists, excluded names, limits) can reuse parsed samples
+instead of re-running the NLP pipeline.
+"""
+
+import os
+import hashlib
+import threading
+
+import spacy
+from spacy.tokens import DocBin
+
+
+class DocCache:
+    """Stores parsed samples on disk, keyed by pipeline version and sample text hash."""
+
+    def __init__(self, nlp, cache_dir: str = "cache/docs"):
+        self.nlp = nlp
+        self.pipeline_version = self._pipeline_version(nlp)
+        self.cache_dir = os.path.join(cache_dir, self.pipeline_version)
+        self._ensure_cache_dir()
+
+    def _ensure_cache_dir(self):
+        """Ensure cache folder exists."""
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+    def _pipeline_version(self, nlp) -> str:
+        """Model name/version, spaCy version and active components - any change invalidates the cache."""
+        meta = nlp.meta
+        components = "+".join(nlp.pipe_names)
+        raw = f"{meta.get('lang')}_{meta.get('name')}-{meta.get('version')}|spacy-{spacy.__version__}|{components}"
+        digest = hashlib.md5(raw.encode()).hexdigest()[:8]
+        return f"{meta.get('lang')}_{meta.get('name')}-{meta.get('version')}-{digest}"
+
+    def _path(self, text: str) -> str:
+        """Cache file path for a sample."""
+        text_hash = hashlib.md5(text.encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{text_hash}.spacy")
+
+    def load(self, text: str):
+        """Return cached Doc for the sample or None."""
+        path = self._path(text)
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with open(path, 'rb') as f:
+                doc_bin = DocBin().from_bytes(f.read())
+            docs = list(doc_bin.get_docs(self.nlp.vocab))
+        except Exception:
+            # Corrupt or incompatible blob - re-parse
+            return None
+
+        return docs[0] if docs else None
+
+    def save(self, text: str, doc):
+        """Save parsed Doc for the sample."""
+        doc_bin = DocBin(docs=[doc])
+        path = self._path(text)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+        # Write then rename so readers never see a half-written blob
+        with open(tmp_path, 'wb') as f:
+            f.write(doc_bin.to_bytes())
+        os.replace(tmp_path, path)
+
+    def parse(self, samples):
+        """Yield Docs for samples - cached ones are loaded, the rest parsed and saved."""
+        for sample in samples:
+            doc = self.load(sample)
+            if doc is None:
+                doc = self.nlp(sample)
+                self.save(sample, doc)
+            yield doc
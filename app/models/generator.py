@@ -1,4 +1,7 @@
+import time
+
 import google.genai as genai
+from google.genai import types
 
 class StoryGenerator:
     """Class for generating stories using Gemini AI."""
@@ -21,17 +24,76 @@ class StoryGenerator:
             "dramatic": "with heightened drama and emotional intensity",
             "poetic": "with poetic, lyrical prose and rich imagery"
         }
+        
+        # Model routing and thinking budget per length - short stories go to the faster tier
+        self.generation_profiles = {
+            "short": {"model": "gemini-2.5-flash-lite", "thinking_budget": 0},
+            "medium": {"model": "gemini-2.5-flash", "thinking_budget": 512},
+            "long": {"model": "gemini-2.5-flash", "thinking_budget": 1024}
+        }
+        
+        # Output token limit = words x tokens per word x headroom (+ thinking budget)
+        self.tokens_per_word = 1.4
+        self.output_token_headroom = 1.5
 
     def generate(self, analysis_data, length="medium", style="same"):
         """Generate a story from analysis data with customization options."""
+        story, _ = self.generate_with_stats(analysis_data, length, style)
+        return story
+
+    def generate_with_stats(self, analysis_data, length="medium", style="same"):
+        """Generate a story and return (story, generation stats)."""
         prompt = self._build_prompt(analysis_data, length, style)
+        return self.generate_from_prompt(prompt, length)
 
+    def generate_from_prompt(self, prompt, length="medium"):
+        """Generate a story from an already built prompt - returns (story, generation stats)."""
+        model, config = self._build_config(length)
+        
+        started = time.time()
         response = self.client.models.generate_content(
-            model='gemini-2.5-flash',
-            contents=prompt
+            model=model,
+            contents=prompt,
+            config=config
         )
+        duration = time.time() - started
+        
+        return response.text, self._generation_stats(response, model, config, duration)
 
-        return response.text
+    def _build_config(self, length="medium"):
+        """Model and generation config derived from the requested length."""
+        profile = self.generation_profiles.get(length, self.generation_profiles["medium"])
+        word_count = self.length_map.get(length, 1000)
+        
+        story_tokens = int(word_count * self.tokens_per_word * self.output_token_headroom)
+        # Thinking tokens count against the output limit
+        config = types.GenerateContentConfig(
+            max_output_tokens=story_tokens + profile["thinking_budget"],
+            thinking_config=types.ThinkingConfig(thinking_budget=profile["thinking_budget"])
+        )
+        
+        return profile["model"], config
+
+    def _generation_stats(self, response, model, config, duration):
+        """Token counts and latency for session metrics."""
+        usage = getattr(response, "usage_metadata", None)
+        output_tokens = getattr(usage, "candidates_token_count", None) or 0
+        
+        finish_reason = None
+        if getattr(response, "candidates", None):
+            finish_reason = str(response.candidates[0].finish_reason)
+        
+        return {
+            "model": model,
+            "max_output_tokens": config.max_output_tokens,
+            "thinking_budget": config.thinking_config.thinking_budget,
+            "prompt_tokens": getattr(usage, "prompt_token_count", None),
+            "output_tokens": output_tokens,
+            "thinking_tokens": getattr(usage, "thoughts_token_count", None),
+            "finish_reason": finish_reason,
+            "duration_seconds": round(duration, 3),
+            "seconds_per_output_token": round(duration / output_tokens, 4) if output_tokens else None
+        }
 
     def _build_prompt(self, data, length="medium", style="same"):
         """Build prompt from data with length and style options."""
@@ -0,0 +1,238 @@
+"""
+Session Analytics - indexed SQLite store for session logs
+Sessions and per-stage timings are written here next to the JSON session files,
+so latency / cache / failure questions don't need to parse every file.
+
+Usage:
+    python -m app.utils.analytics latency --stage "NLP Analysis" --book "Moby Dick.txt" --since 7 --p 95
+    python -m app.utils.analytics cache-hits --since 30
+    python -m app.utils.analytics failures --by book
+    python -m app.utils.analytics import   # backfill from logs/sessions/*.json
+"""
+
+import os
+import sys
+import json
+import glob
+import sqlite3
+import argparse
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT NOT NULL,
+    book_name TEXT NOT NULL,
+    length TEXT,
+    style TEXT,
+    status TEXT NOT NULL,
+    started_at TEXT NOT NULL,
+    duration_seconds REAL,
+    cache_hit INTEGER NOT NULL DEFAULT 0,
+    metrics TEXT,
+    PRIMARY KEY (session_id, book_name)
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_book ON sessions (book_name, started_at);
+CREATE INDEX IF NOT EXISTS idx_sessions_status ON sessions (status, started_at);
+CREATE INDEX IF NOT EXISTS idx_sessions_started ON sessions (started_at);
+
+CREATE TABLE IF NOT EXISTS stage_timings (
+    session_id TEXT NOT NULL,
+    book_name TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    duration_seconds REAL NOT NULL,
+    started_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_stage_timings_stage ON stage_timings (stage, started_at);
+CREATE INDEX IF NOT EXISTS idx_stage_timings_session ON stage_timings (session_id, book_name);
+"""
+
+# Columns allowed in --by grouping
+GROUP_COLUMNS = {"book": "book_name", "style": "style", "length": "length", "status": "status"}
+
+
+def _percentile(values: List[float], p: float) -> Optional[float]:
+    """Linear-interpolated percentile (p in 0-100)."""
+    if not values:
+        return None
+
+    values = sorted(values)
+    rank = (len(values) - 1) * p / 100
+    low = int(rank)
+    high = min(low + 1, len(values) - 1)
+    return round(values[low] + (values[high] - values[low]) * (rank - low), 3)
+
+
+class SessionStore:
+    """SQLite store for session summaries and stage timings."""
+
+    def __init__(self, db_path: str = "logs/analytics.db"):
+        self.db_path = db_path
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        """New connection per call (sessions end on different threads) - commits on success."""
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def record_session(self, session: Dict[str, Any]):
+        """Write one finished session (same dict as the session JSON file)."""
+        settings = session.get("settings", {})
+        metrics = session.get("metrics", {})
+        key = (session["session_id"], session["book_name"])
+
+        # A step's duration_seconds is the time since the previous step,
+        # so each stage's time is stored on the step that follows it
+        steps = session.get("steps", [])
+        stage_rows = [
+            key + (step["name"], next_step["duration_seconds"], step["timestamp"])
+            for step, next_step in zip(steps, steps[1:])
+            if "duration_seconds" in next_step
+        ]
+
+        with self._connect() as conn:
+            conn.execute("DELETE FROM stage_timings WHERE session_id = ? AND book_name = ?", key)
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                key + (
+                    settings.get("length"),
+                    settings.get("style"),
+                    session.get("status", "started"),
+                    session["started_at"],
+                    session.get("total_duration_seconds"),
+                    1 if metrics.get("cache_hit") else 0,
+                    json.dumps(metrics, ensure_ascii=False)
+                )
+            )
+            conn.executemany("INSERT INTO stage_timings VALUES (?, ?, ?, ?, ?)", stage_rows)
+
+    def import_session_files(self, sessions_dir: str = "logs/sessions") -> int:
+        """Backfill the store from existing session JSON files."""
+        count = 0
+        for path in sorted(glob.glob(os.path.join(sessions_dir, "*.json"))):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.record_session(json.load(f))
+            count += 1
+        return count
+
+    def _filters(self, prefix: str, book: str = None, style: str = None, length: str = None,
+                 since_days: float = None, status: str = None):
+        """WHERE clause + params for the common filters."""
+        clauses, params = [], []
+        for column, value in (("book_name", book), ("style", style), ("length", length), ("status", status)):
+            if value is not None:
+                clauses.append(f"s.{column} = ?")
+                params.append(value)
+        if since_days is not None:
+            clauses.append(f"{prefix}.started_at >= ?")
+            params.append((datetime.now() - timedelta(days=since_days)).isoformat())
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def latency_percentiles(self, stage: str = None, book: str = None, style: str = None,
+                            length: str = None, since_days: float = None,
+                            percentiles=(50, 95, 99), group_by: str = None) -> Dict[str, Dict[str, Any]]:
+        """Latency percentiles for a stage (or the whole session when stage is None).
+
+        Session totals only count successful sessions. Returns {group: {"count", "p50", ...}}.
+        """
+        group_column = f"s.{GROUP_COLUMNS[group_by]}" if group_by else "'all'"
+
+        if stage is None:
+            where, params = self._filters("s", book, style, length, since_days, status="success")
+            query = f"SELECT {group_column}, s.duration_seconds FROM sessions s{where}"
+            query += " AND s.duration_seconds IS NOT NULL"
+        else:
+            where, params = self._filters("t", book, style, length, since_days)
+            where = (where + " AND" if where else " WHERE") + " t.stage = ?"
+            params.append(stage)
+            query = (f"SELECT {group_column}, t.duration_seconds FROM stage_timings t "
+                     f"JOIN sessions s ON s.session_id = t.session_id AND s.book_name = t.book_name{where}")
+
+        groups: Dict[str, List[float]] = {}
+        with self._connect() as conn:
+            for group, duration in conn.execute(query, params):
+                groups.setdefault(group, []).append(duration)
+
+        return {
+            group: {"count": len(values), **{f"p{p:g}": _percentile(values, p) for p in percentiles}}
+            for group, values in sorted(groups.items(), key=lambda item: str(item[0]))
+        }
+
+    def cache_hit_rate(self, book: str = None, since_days: float = None, bucket: str = "day") -> Dict[str, Dict[str, Any]]:
+        """Cache hit rate per day (or per hour) - {bucket: {"sessions", "hit_rate"}}."""
+        bucket_len = 13 if bucket == "hour" else 10  # ISO timestamp prefix: YYYY-MM-DDTHH / YYYY-MM-DD
+        where, params = self._filters("s", book=book, since_days=since_days)
+        query = (f"SELECT substr(s.started_at, 1, {bucket_len}) AS bucket, COUNT(*), SUM(s.cache_hit) "
+                 f"FROM sessions s{where} GROUP BY bucket ORDER BY bucket")
+
+        with self._connect() as conn:
+            return {
+                row[0]: {"sessions": row[1], "hit_rate": round(row[2] / row[1], 3)}
+                for row in conn.execute(query, params)
+            }
+
+    def failure_rate(self, since_days: float = None, group_by: str = None) -> Dict[str, Dict[str, Any]]:
+        """Failed session share - {group: {"sessions", "failed", "failure_rate"}}."""
+        group_column = f"s.{GROUP_COLUMNS[group_by]}" if group_by else "'all'"
+        where, params = self._filters("s", since_days=since_days)
+        query = (f"SELECT {group_column} AS grp, COUNT(*), SUM(s.status = 'failed') "
+                 f"FROM sessions s{where} GROUP BY grp ORDER BY grp")
+
+        with self._connect() as conn:
+            return {
+                row[0]: {"sessions": row[1], "failed": row[2], "failure_rate": round(row[2] / row[1], 3)}
+                for row in conn.execute(query, params)
+            }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query story producer session analytics.")
+    parser.add_argument("--db", default="logs/analytics.db")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    latency = commands.add_parser("latency", help="Latency percentiles per stage")
+    latency.add_argument("--stage", help="Stage name, e.g. 'NLP Analysis' (default: whole session)")
+    latency.add_argument("--book")
+    latency.add_argument("--style")
+    latency.add_argument("--length")
+    latency.add_argument("--since", type=float, help="Only the last N days")
+    latency.add_argument("--p", type=float, nargs="*", default=[50, 95, 99])
+    latency.add_argument("--by", choices=sorted(GROUP_COLUMNS))
+
+    cache_hits = commands.add_parser("cache-hits", help="Cache hit rate over time")
+    cache_hits.add_argument("--book")
+    cache_hits.add_argument("--since", type=float)
+    cache_hits.add_argument("--bucket", choices=["day", "hour"], default="day")
+
+    failures = commands.add_parser("failures", help="Failure rates")
+    failures.add_argument("--since", type=float)
+    failures.add_argument("--by", choices=sorted(GROUP_COLUMNS))
+
+    backfill = commands.add_parser("import", help="Backfill from session JSON files")
+    backfill.add_argument("--sessions-dir", default="logs/sessions")
+
+    args = parser.parse_args()
+    store = SessionStore(args.db)
+
+    if args.command == "latency":
+        result = store.latency_percentiles(args.stage, args.book, args.style, args.length,
+                                           args.since, tuple(args.p), args.by)
+    elif args.command == "cache-hits":
+        result = store.cache_hit_rate(args.book, args.since, args.bucket)
+    elif args.command == "failures":
+        result = store.failure_rate(args.since, args.by)
+    else:
+        result = {"imported_sessions": store.import_session_files(args.sessions_dir)}
+
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,211 @@
+"""
+Static Assets - fingerprinted, precompressed CSS/JS and compressed book files
+Fingerprinted files get long-lived immutable caching, everything else revalidates with ETag.
+Usage: python -m app.utils.assets   (also runs on server startup, skipping up-to-date files)
+"""
+
+import os
+import re
+import stat
+import gzip
+import json
+import hashlib
+import mimetypes
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.staticfiles import StaticFiles
+
+# Optional - only gzip variants are generated without it
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_DIR = "static"
+DIST_DIR = "dist"  # Fingerprinted assets, relative to STATIC_DIR
+MANIFEST_FILE = "manifest.json"
+
+# Source assets to fingerprint and directories whose files are only precompressed
+FINGERPRINT_DIRS = {"css": ".css", "js": ".js"}
+PRECOMPRESS_DIRS = {"books": ".txt"}
+
+COMPRESSIBLE_MIN_BYTES = 1024
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+# style.1a2b3c4d5e.css - name produced by build_assets
+_fingerprinted = re.compile(r"\.[0-9a-f]{10}\.\w+$")
+
+# Try brotli first - smaller than gzip
+_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def _is_stale(target: str, source: str) -> bool:
+    return not os.path.exists(target) or os.path.getmtime(target) < os.path.getmtime(source)
+
+
+def _write_compressed(path: str, data: bytes):
+    """Write .gz (and .br when brotli is installed) variants next to path."""
+    if len(data) < COMPRESSIBLE_MIN_BYTES:
+        return
+
+    if _is_stale(path + ".gz", path):
+        with open(path + ".gz", 'wb') as f:
+            # mtime=0 keeps output (and so the ETag size) stable across builds
+            f.write(gzip.compress(data, compresslevel=9, mtime=0))
+
+    if brotli and _is_stale(path + ".br", path):
+        with open(path + ".br", 'wb') as f:
+            f.write(brotli.compress(data, quality=11))
+
+
+def precompress_file(path: str):
+    """Write compressed variants for one file (e.g. a newly uploaded book)."""
+    with open(path, 'rb') as f:
+        _write_compressed(path, f.read())
+
+
+def accepts_encoding(accept_encoding: str, encoding: str) -> bool:
+    """True if the Accept-Encoding header allows encoding (honours q-values, q=0 refuses)."""
+    qualities = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding] = quality
+
+    return qualities.get(encoding, qualities.get("*", 0.0)) > 0
+
+
+def build_assets(static_dir: str = STATIC_DIR) -> dict:
+    """Fingerprint CSS/JS into static/dist, precompress them and the books.
+
+    Returns the manifest {"css/style.css": "dist/css/style.<hash>.css"}.
+    """
+    manifest = {}
+
+    for sub_dir, extension in FINGERPRINT_DIRS.items():
+        source_dir = os.path.join(static_dir, sub_dir)
+        if not os.path.isdir(source_dir):
+            continue
+
+        target_dir = os.path.join(static_dir, DIST_DIR, sub_dir)
+        os.makedirs(target_dir, exist_ok=True)
+
+        for name in sorted(os.listdir(source_dir)):
+            if not name.endswith(extension):
+                continue
+
+            with open(os.path.join(source_dir, name), 'rb') as f:
+                data = f.read()
+
+            digest = hashlib.md5(data).hexdigest()[:10]
+            fingerprinted = f"{name[:-len(extension)]}.{digest}{extension}"
+            target = os.path.join(target_dir, fingerprinted)
+
+            # Content-addressed - an existing file is already up to date
+            if not os.path.exists(target):
+                with open(target, 'wb') as f:
+                    f.write(data)
+            _write_compressed(target, data)
+
+            manifest[f"{sub_dir}/{name}"] = f"{DIST_DIR}/{sub_dir}/{fingerprinted}"
+
+    for sub_dir, extension in PRECOMPRESS_DIRS.items():
+        source_dir = os.path.join(static_dir, sub_dir)
+        if not os.path.isdir(source_dir):
+            continue
+
+        for name in sorted(os.listdir(source_dir)):
+            path = os.path.join(source_dir, name)
+            if name.endswith(extension) and (_is_stale(path + ".gz", path) or (brotli and _is_stale(path + ".br", path))):
+                with open(path, 'rb') as f:
+                    _write_compressed(path, f.read())
+
+    with open(os.path.join(static_dir, DIST_DIR, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+    return manifest
+
+
+class AssetManifest:
+    """Maps source asset paths to fingerprinted URLs - for templates."""
+
+    def __init__(self, manifest: dict, url_prefix: str = "/static"):
+        self.manifest = manifest
+        self.url_prefix = url_prefix
+
+    def url(self, path: str) -> str:
+        """URL of the fingerprinted asset (falls back to the source file)."""
+        return f"{self.url_prefix}/{self.manifest.get(path, path)}"
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles that serves .br/.gz variants and sets Cache-Control.
+
+    ETag / Last-Modified and 304 handling come from StaticFiles itself.
+    """
+
+    async def get_response(self, path: str, scope) -> Response:
+        response = None
+        accept_encoding = Headers(scope=scope).get("accept-encoding", "")
+
+        if scope["method"] in ("GET", "HEAD"):
+            for encoding, suffix in _ENCODINGS:
+                if not accepts_encoding(accept_encoding, encoding):
+                    continue
+                try:
+                    full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path + suffix)
+                except OSError:
+                    continue
+                if stat_result and stat.S_ISREG(stat_result.st_mode):
+                    response = self.file_response(full_path, stat_result, scope)
+                    if response.status_code == 200:
+                        response.headers["content-encoding"] = encoding
+                        response.headers["content-type"] = self._media_type(path)
+                    break
+
+        if response is None:
+            response = await super().get_response(path, scope)
+
+        response.headers["vary"] = "Accept-Encoding"
+        response.headers["cache-control"] = (
+            IMMUTABLE_CACHE_CONTROL if _fingerprinted.search(path) else REVALIDATE_CACHE_CONTROL
+        )
+        return response
+
+    def _media_type(self, path: str) -> str:
+        media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if media_type.startswith("text/") or media_type == "application/javascript":
+            media_type += "; charset=utf-8"
+        return media_type
+
+
+def compressed_json(payload, accept_encoding: str, status_code: int = 200) -> Response:
+    """JSON response, gzip-compressed when the client accepts it and it is worth it."""
+    body = json.dumps(payload, ensure_ascii=False).encode()
+    headers = {"vary": "Accept-Encoding"}
+
+    if accepts_encoding(accept_encoding, "gzip") and len(body) >= COMPRESSIBLE_MIN_BYTES:
+        body = gzip.compress(body, compresslevel=6)
+        headers["content-encoding"] = "gzip"
+
+    return Response(body, status_code=status_code, media_type="application/json", headers=headers)
+
+
+if __name__ == "__main__":
+    for source, target in build_assets().items():
+        print(f"{source} -> {target}")
@@ -5,11 +5,16 @@ Separate log file for each story generation + general summary log
 
 import os
 import json
+import queue
+import atexit
 import logging
+import threading
 from datetime import datetime
 from typing import Optional, Dict, Any
 import time
 
+from app.utils.analytics import SessionStore
+
 class StoryLogger:
     """Logs story generation process."""
     
@@ -34,6 +39,16 @@ class StoryLogger:
         if not self.logger.handlers:
             self.logger.addHandler(file_handler)
         
+        # Indexed analytics store (sessions + stage timings)
+        self.analytics = SessionStore(os.path.join(self.logs_dir, "analytics.db"))
+        
+        # Sessions end inside async request handlers - sqlite writes (which may wait
+        # on a locked db) happen on a background thread, not the event loop
+        self._analytics_queue = queue.Queue()
+        self._analytics_writer = threading.Thread(target=self._write_analytics, daemon=True)
+        self._analytics_writer.start()
+        atexit.register(self._flush_analytics)
+        
         # Current process data
         self.current_session: Optional[Dict[str, Any]] = None
         self.step_times: Dict[str, float] = {}
@@ -47,6 +62,22 @@ class StoryLogger:
         sessions_dir = os.path.join(self.logs_dir, "sessions")
         if not os.path.exists(sessions_dir):
             os.makedirs(sessions_dir)
+        
+        # Profiles folder (opt-in request profiling)
+        profiles_dir = os.path.join(self.logs_dir, "profiles")
+        if not os.path.exists(profiles_dir):
+            os.makedirs(profiles_dir)
+    
+    def _session_basename(self) -> str:
+        """File name (without extension) shared by session JSON and profile."""
+        return f"{self.current_session['session_id']}_{self.current_session['book_name'].replace('.txt', '').replace(' ', '_')}"
+    
+    def get_profile_path(self) -> Optional[str]:
+        """Profile file path for the current session."""
+        if not self.current_session:
+            return None
+        
+        return os.path.join(self.logs_dir, "profiles", f"{self._session_basename()}.prof")
     
     def start_session(self, book_name: str, length: str, style: str) -> str:
         """Start a new story generation session."""
@@ -127,6 +158,16 @@ class StoryLogger:
         
         self.logger.info(f"🔬 Sampling: {num_samples} samples × {sample_size//1000}KB = {total_analyzed//1000}KB")
     
+    def log_adaptive_sampling(self, sampling: Dict[str, Any]):
+        """Log how many samples adaptive sampling actually used."""
+        if not sampling:
+            return
+        
+        self.log_metric("samples_used", sampling.get("samples_used"))
+        self.log_metric("sampling_confidence", sampling.get("confidence"))
+        
+        self.logger.info(f"🎯 Adaptive sampling: {sampling.get('samples_used')}/{sampling.get('samples_available')} samples | confidence: {sampling.get('confidence')}")
+    
     def log_analysis_results(self, analysis: Dict[str, Any]):
         """Log analysis results."""
         if not analysis:
@@ -144,6 +185,20 @@ class StoryLogger:
         
         self.logger.info(f"🎭 Analysis: {results['characters_found']} characters, {results['keywords_found']} keywords")
     
+    def log_memory(self, stages: Dict[str, Dict[str, Any]]):
+        """Log per-stage memory usage (traced peak + RSS peak)."""
+        if not stages:
+            return
+        
+        for stage_name, stats in stages.items():
+            self.log_metric(f"memory_{stage_name}", stats)
+        
+        peak_stage = max(stages, key=lambda name: stages[name].get("traced_peak_mb", 0))
+        peak = stages[peak_stage]
+        self.log_metric("memory_peak_mb", peak.get("traced_peak_mb"))
+        
+        self.logger.info(f"🧠 Memory: peak {peak.get('traced_peak_mb')} MB in {peak_stage} | RSS {peak.get('rss_peak_mb')} MB")
+    
     def log_story_generated(self, story_length: int):
         """Log that story was generated."""
         word_count = len(story_length.split()) if isinstance(story_length, str) else story_length
@@ -151,6 +206,18 @@ class StoryLogger:
         self.log_metric("story_word_count", word_count)
         self.logger.info(f"✍️ Story generated: ~{word_count} words")
     
+    def log_generation_stats(self, stats: Dict[str, Any]):
+        """Log model, token counts and per-token latency of story generation."""
+        if not stats:
+            return
+        
+        self.log_metric("generation", stats)
+        self.logger.info(
+            f"🤖 Generation: {stats.get('model')} | prompt {stats.get('prompt_tokens')} tokens | "
+            f"output {stats.get('output_tokens')}/{stats.get('max_output_tokens')} tokens | "
+            f"{stats.get('seconds_per_output_token')} s/token"
+        )
+    
     def log_error(self, error: str, step: str = None):
         """Log error."""
         if self.current_session:
@@ -186,7 +253,7 @@ class StoryLogger:
         session_file = os.path.join(
             self.logs_dir, 
             "sessions", 
-            f"{self.current_session['session_id']}_{self.current_session['book_name'].replace('.txt', '').replace(' ', '_')}.json"
+            f"{self._session_basename()}.json"
         )
         
         with open(session_file, 'w', encoding='utf-8') as f:
@@ -200,9 +267,30 @@ class StoryLogger:
         # Append to summary file
         self._append_to_summary()
         
+        # Index for analytics queries (background writer)
+        self._analytics_queue.put(self.current_session)
+        
         self.current_session = None
         self.step_times = {}
     
+    def _write_analytics(self):
+        """Background writer for the analytics store - never fail a session because of it."""
+        while True:
+            session = self._analytics_queue.get()
+            try:
+                if session is None:
+                    return
+                self.analytics.record_session(session)
+            except Exception as e:
+                self.logger.error(f"❌ Analytics store error: {e}")
+            finally:
+                self._analytics_queue.task_done()
+    
+    def _flush_analytics(self, timeout: float = 15):
+        """Write queued sessions before exit (e.g. at the end of a batch run)."""
+        self._analytics_queue.put(None)
+        self._analytics_writer.join(timeout)
+    
     def _append_to_summary(self):
         """Append to summary log file."""
         if not self.current_session:
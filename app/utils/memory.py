@@ -0,0 +1,193 @@
+"""
+Memory Tracker - per-stage peak memory (tracemalloc + RSS sampling)
+Also a memory regression check: python -m app.utils.memory
+"""
+
+import os
+import sys
+import time
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+# Memory tracking adds tracemalloc overhead - off unless enabled
+MEMORY_TRACKING_ENABLED = os.environ.get("STORY_MEMORY_TRACKING", "0") == "1"
+
+# Regression bound for analyzing the largest bundled book
+MEMORY_BOUND_MB = float(os.environ.get("STORY_MEMORY_BOUND_MB", "300"))
+
+RSS_SAMPLE_INTERVAL = 0.05  # seconds
+
+
+def _to_mb(size_bytes: int) -> float:
+    return round(size_bytes / (1024 * 1024), 2)
+
+
+def current_rss() -> int:
+    """Current resident set size in bytes (0 if unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+
+    try:
+        import resource
+        # No current RSS outside Linux - fall back to the process peak
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return max_rss if sys.platform == "darwin" else max_rss * 1024
+    except ImportError:
+        return 0
+
+
+class _RssSampler(threading.Thread):
+    """Samples RSS in the background and keeps the highest value."""
+
+    def __init__(self, interval: float = RSS_SAMPLE_INTERVAL):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = current_rss()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+    def stop(self) -> int:
+        self._stop_event.set()
+        self.join()
+        self.peak = max(self.peak, current_rss())
+        return self.peak
+
+
+class _OpenStage:
+    """A stage that is still being measured."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.traced_before, _ = tracemalloc.get_traced_memory()
+        self.traced_peak = self.traced_before
+        self.sampler = _RssSampler()
+        self.sampler.start()
+        self.started = time.time()
+
+
+# tracemalloc has one process-wide peak. Before anyone resets it, the peak so far is
+# folded into every open stage, so overlapping stages (background analysis,
+# concurrent requests) don't lose each other's peaks.
+_open_stages = set()
+_open_stages_lock = threading.Lock()
+
+
+def _fold_peak():
+    """Credit the peak since the last reset to all open stages, then reset it. Hold the lock."""
+    _, traced_peak = tracemalloc.get_traced_memory()
+    for open_stage in _open_stages:
+        open_stage.traced_peak = max(open_stage.traced_peak, traced_peak)
+    tracemalloc.reset_peak()
+
+
+class MemoryTracker:
+    """Measures memory for each pipeline stage.
+
+    Stages may overlap (e.g. a background analysis running during generation).
+    tracemalloc is process-wide, so concurrent requests show up in each other's numbers.
+    """
+
+    def __init__(self, enabled: bool = MEMORY_TRACKING_ENABLED):
+        self.enabled = enabled
+        self.stages = {}
+        self._running = {}
+
+        if self.enabled and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def start_stage(self, name: str):
+        """Start measuring a stage - finish it with end_stage."""
+        if not self.enabled:
+            return
+
+        with _open_stages_lock:
+            _fold_peak()
+            open_stage = _OpenStage(name)
+            _open_stages.add(open_stage)
+        self._running[name] = open_stage
+
+    def end_stage(self, name: str, complete: bool = True) -> dict:
+        """Stop measuring a stage and record traced delta/peak and RSS peak.
+
+        complete=False marks a stage cut short (still running when results were logged).
+        """
+        open_stage = self._running.pop(name, None)
+        if open_stage is None:
+            return None
+
+        with _open_stages_lock:
+            _fold_peak()
+            _open_stages.discard(open_stage)
+            traced_after, _ = tracemalloc.get_traced_memory()
+
+        stats = {
+            "traced_delta_mb": _to_mb(traced_after - open_stage.traced_before),
+            "traced_peak_mb": _to_mb(open_stage.traced_peak - open_stage.traced_before),
+            "rss_peak_mb": _to_mb(open_stage.sampler.stop()),
+            "duration_seconds": round(time.time() - open_stage.started, 3)
+        }
+        if not complete:
+            stats["complete"] = False
+        self.stages[name] = stats
+
+        return stats
+
+    def end_running_stages(self):
+        """End stages still running (e.g. background work) as incomplete - before logging."""
+        for name in list(self._running):
+            self.end_stage(name, complete=False)
+
+    @contextmanager
+    def stage(self, name: str):
+        """Record traced allocation delta/peak and RSS peak for the block."""
+        self.start_stage(name)
+        try:
+            yield
+        finally:
+            self.end_stage(name)
+
+
+def check_memory_bound(books_dir: str = "static/books", bound_mb: float = MEMORY_BOUND_MB) -> bool:
+    """Analyze the largest bundled book and check its peak allocation stays under bound_mb."""
+    from app.models.analyzer import BookAnalyzer
+
+    books = [os.path.join(books_dir, f) for f in os.listdir(books_dir) if f.endswith(".txt")]
+    largest = max(books, key=os.path.getsize)
+
+    # No Doc cache - measure a full NLP run
+    analyzer = BookAnalyzer(doc_cache_dir=None)
+    tracker = MemoryTracker(enabled=True)
+
+    # Enclosing stage - the bound is on the whole run, including text/samples held across stages
+    with tracker.stage("book_analysis"):
+        with tracker.stage("file_reading"):
+            with open(largest, 'r', encoding='utf-8') as f:
+                text = f.read()
+        with tracker.stage("text_cleaning"):
+            cleaned_text = analyzer._clean_text(text)
+        with tracker.stage("sampling"):
+            samples = analyzer._get_adaptive_samples(cleaned_text)
+        with tracker.stage("nlp_analysis"):
+            analyzer._analyze_samples(samples, cleaned_text)
+
+    for name, stats in tracker.stages.items():
+        print(f"{name:15} peak {stats['traced_peak_mb']:8.2f} MB | rss {stats['rss_peak_mb']:8.2f} MB")
+
+    peak = tracker.stages["book_analysis"]["traced_peak_mb"]
+    ok = peak <= bound_mb
+    print(f"{'✅' if ok else '❌'} {os.path.basename(largest)}: peak {peak:.2f} MB (bound {bound_mb:.0f} MB)")
+
+    return ok
+
+
+if __name__ == "__main__":
+    # Add project root to path to import models
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+    sys.exit(0 if check_memory_bound() else 1)
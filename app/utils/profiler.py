@@ -0,0 +1,60 @@
+"""
+Request Profiler - opt-in cProfile for a single story request
+Work done in worker threads (asyncio.to_thread) is profiled per call and merged into one pstats file.
+Only one call is profiled at a time per process - Python 3.12+ cProfile (sys.monitoring)
+allows a single active profiler, so overlapping calls run unprofiled.
+"""
+
+import cProfile
+import pstats
+import threading
+from functools import wraps
+
+# One active cProfile per process (held for the whole profiled call)
+_active_profile_lock = threading.Lock()
+
+
+class RequestProfiler:
+    """Collects cProfile data for the calls of one request."""
+
+    def __init__(self):
+        self._profiles = []
+        self._lock = threading.Lock()
+        self.skipped_calls = 0
+
+    def call(self, func, *args, **kwargs):
+        """Run func under a profiler in the current thread (unprofiled if another call is being profiled)."""
+        if not _active_profile_lock.acquire(blocking=False):
+            with self._lock:
+                self.skipped_calls += 1
+            return func(*args, **kwargs)
+
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(func, *args, **kwargs)
+        finally:
+            _active_profile_lock.release()
+            with self._lock:
+                self._profiles.append(profile)
+
+    def wrap(self, func):
+        """Profiled version of func - for asyncio.to_thread."""
+        @wraps(func)
+        def profiled(*args, **kwargs):
+            return self.call(func, *args, **kwargs)
+        return profiled
+
+    def save(self, path: str) -> str:
+        """Merge collected profiles and dump them as a pstats file (view with snakeviz / pstats)."""
+        with self._lock:
+            profiles = list(self._profiles)
+
+        if not profiles:
+            return None
+
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        stats.dump_stats(path)
+
+        return path
@@ -0,0 +1,53 @@
+"""
+Upload helpers - incremental decoding and hashing of streamed book uploads
+Hash matches the one computed on file contents read in text mode (utf-8, universal newlines).
+"""
+
+import codecs
+import hashlib
+
+
+class StreamingTextHasher:
+    """Decodes uploaded chunks and hashes the text exactly like open(..., 'r').read() would see it."""
+
+    def __init__(self, prefix_limit: int = 0):
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._md5 = hashlib.md5()
+        self._pending_cr = False  # '\r' at chunk end - may be the first half of '\r\n'
+
+        # Beginning of the text, kept for analysis while the rest is still uploading
+        self.prefix_limit = prefix_limit
+        self.prefix = ""
+        self.text_length = 0
+
+    def feed(self, chunk: bytes) -> str:
+        """Add a raw chunk, return its decoded and newline-normalized text."""
+        text = self._decoder.decode(chunk)
+        return self._consume(text, final=False)
+
+    def finish(self) -> str:
+        """Flush the decoder - raises UnicodeDecodeError on a truncated sequence."""
+        text = self._decoder.decode(b"", final=True)
+        return self._consume(text, final=True)
+
+    def hexdigest(self) -> str:
+        return self._md5.hexdigest()
+
+    def _consume(self, text: str, final: bool) -> str:
+        if self._pending_cr:
+            text = "\r" + text
+            self._pending_cr = False
+
+        if text.endswith("\r") and not final:
+            text = text[:-1]
+            self._pending_cr = True
+
+        # Universal newlines - same as text mode reading
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+
+        self._md5.update(text.encode())
+        self.text_length += len(text)
+        if len(self.prefix) < self.prefix_limit:
+            self.prefix += text[:self.prefix_limit - len(self.prefix)]
+
+        return text
@@ -1,6 +1,7 @@
 // Global variables
 let currentAnalysis = null;
 let currentBookName = '';
+let activeEventSource = null;
 
 function selectBook(bookName) {
     // Remove selection from all cards
@@ -33,6 +34,13 @@ async function generateStory() {
     const bookName = document.getElementById('selectedBook').value;
     if (!bookName) return;
 
+    // Önceki akış hâlâ tam analizi bekliyor olabilir - eski kitabın analizi gelmesin
+    if (activeEventSource) {
+        activeEventSource.close();
+        activeEventSource = null;
+    }
+    currentAnalysis = null;
+
     // Get options
     const storyLength = document.getElementById('storyLength').value;
     const storyStyle = document.getElementById('storyStyle').value;
@@ -57,8 +65,9 @@ async function generateStory() {
 
     try {
         // SSE ile gerçek zamanlı ilerleme
-        const url = `/produce-story-stream?book_filename=${encodeURIComponent(bookName)}&length=${storyLength}&style=${storyStyle}`;
+        const url = `/produce-story-stream?book_filename=${encodeURIComponent(bookName)}&length=${storyLength}&style=${storyStyle}&progressive=true`;
         const eventSource = new EventSource(url);
+        activeEventSource = eventSource;
         
         let finalData = null;
         
@@ -73,17 +82,26 @@ async function generateStory() {
             // Update progress UI
             updateProgressFromServer(data);
             
-            // Eğer analiz verisi geldiyse göster
-            if (data.analysis && !currentAnalysis) {
+            // Eğer analiz verisi geldiyse göster (tam analiz ön analizin yerini alır)
+            if (data.analysis && (!currentAnalysis || data.refined)) {
                 currentAnalysis = data.analysis;
                 displayAnalysis(data.analysis);
                 analysisSection.classList.remove('hidden');
             }
             
+            // Tam analiz hikayeden sonra geldi - bağlantıyı kapat
+            if (data.step === 8) {
+                eventSource.close();
+                return;
+            }
+            
             // Final sonuç
             if (data.step === 7 && data.story) {
                 finalData = data;
-                eventSource.close();
+                // Tam analiz hâlâ sürüyorsa bağlantıyı açık tut
+                if (!data.refining) {
+                    eventSource.close();
+                }
                 
                 // Hide loading, show result
                 loadingSection.classList.add('hidden');
@@ -139,8 +157,8 @@ function updateProgressFromServer(data) {
         1: { uiStep: 1, text: 'Dosya okunuyor...' },
         2: { uiStep: 1, text: data.cached ? "Cache'den yükleniyor..." : 'Metin temizleniyor...' },
         3: { uiStep: 1, text: 'Metin örnekleniyor...' },
-        4: { uiStep: 2, text: 'NLP analizi yapılıyor...' },
-        5: { uiStep: 2, text: 'Analiz tamamlandı!' },
+        4: { uiStep: 2, text: data.samples_total ? `NLP analizi yapılıyor... (${data.samples_done}/${data.samples_total})` : 'NLP analizi yapılıyor...' },
+        5: { uiStep: 2, text: data.preliminary ? 'Ön analiz tamamlandı!' : 'Analiz tamamlandı!' },
         6: { uiStep: 3, text: 'Hikaye yazılıyor...' },
         7: { uiStep: 3, text: 'Tamamlandı!' }
     };